@@ -1,54 +1,294 @@
+import asyncio
+import json
+import tarfile
+from pathlib import Path
+
+import aiohttp
+import numpy as np
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
+import pyarrow as pa
 import requests
-from io import StringIO
+from io import BytesIO
+from pyarrow import csv as pa_csv
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
 
 st.set_page_config(page_title="📈 NSE Stock Analyzer", layout="wide")
 
 # GitHub access
 GITHUB_API_URL = "https://api.github.com/repos/Finpro-Sam/stock_analyser/contents/"
 RAW_BASE_URL = "https://raw.githubusercontent.com/Finpro-Sam/stock_analyser/main/"
+TARBALL_URL = "https://codeload.github.com/Finpro-Sam/stock_analyser/tar.gz/refs/heads/main"
+
+# Concurrent downloads (bounded so GitHub doesn't rate-limit us)
+MAX_CONCURRENT_DOWNLOADS = 16
+
+# Disk cache: survives container restarts; the SHA map records which
+# GitHub blob each cached file's rows came from
+CACHE_DIR = Path(".cache")
+DATA_CACHE = CACHE_DIR / "bhavcopy.parquet"
+SHA_CACHE = CACHE_DIR / "bhavcopy.shas.json"
+DATA_COLUMNS = ['Date', 'ISIN', 'Ticker', 'Price', 'Volume']
+
+# Multithreaded Arrow CSV parse straight from bytes: only the needed
+# columns, with final dtypes, no str/StringIO copies in between
+ARROW_CONVERT_OPTIONS = pa_csv.ConvertOptions(
+    include_columns=['TradDt', 'ISIN', 'TckrSymb', 'ClsPric', 'TtlTradgVol'],
+    column_types={'ClsPric': pa.float32(),
+                  'TtlTradgVol': pa.uint32(),
+                  'TradDt': pa.timestamp('ns')},
+)
+
+if HAS_NUMBA:
+    # Fused per-group mean/std/alert pass over ISIN-contiguous arrays;
+    # one memory sweep per group, parallelized across groups
+    @njit(parallel=True, cache=True)
+    def _alert_kernel(price, volume, starts, ends, std_k, vol_k,
+                      price_alert, volume_spike, g_mean, g_std, g_vmean):
+        for g in prange(len(starts)):
+            s, e = starts[g], ends[g]
+            n = e - s
+            m = 0.0
+            vm = 0.0
+            for i in range(s, e):
+                m += price[i]
+                vm += volume[i]
+            m /= n
+            vm /= n
+            ss = 0.0
+            for i in range(s, e):
+                d = price[i] - m
+                ss += d * d
+            sd = np.sqrt(ss / (n - 1)) if n > 1 else 0.0
+            g_mean[g] = m
+            g_std[g] = sd
+            g_vmean[g] = vm
+            hi = m + std_k * sd
+            lo = m - std_k * sd
+            for i in range(s, e):
+                price_alert[i] = price[i] > hi or price[i] < lo
+                volume_spike[i] = volume[i] > vol_k * vm
+
+async def _fetch(session, url, semaphore):
+    async with semaphore:
+        async with session.get(url) as response:
+            response.raise_for_status()
+            return await response.read()
+
+async def _fetch_all(urls):
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+    # One session for all downloads: TLS handshakes and connections are
+    # reused across files, transfers are gzip-compressed, and a slow CDN
+    # node can't hang the loader indefinitely
+    async with aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=30),
+        connector=aiohttp.TCPConnector(limit=MAX_CONCURRENT_DOWNLOADS),
+        headers={'Accept-Encoding': 'gzip'},
+    ) as session:
+        return await asyncio.gather(*(_fetch(session, url, semaphore) for url in urls))
+
+# File listing via the GitHub Contents API: one small JSON payload with
+# blob SHAs included, cached so repeat loads within the TTL skip the call
+@st.cache_data(ttl=600, show_spinner=False)
+def list_csv_shas():
+    response = requests.get(GITHUB_API_URL, timeout=30)
+    response.raise_for_status()
+    return {f['name']: f['sha'] for f in response.json() if f['name'].endswith('.csv')}
+
+def _fetch_tarball_csvs(names):
+    # One bulk transfer of the whole repo beats N per-file round trips when
+    # (nearly) everything has to be fetched anyway; the tarball is streamed
+    # straight into the tar reader, never fully buffered
+    wanted = set(names)
+    contents = {}
+    response = requests.get(TARBALL_URL, stream=True, timeout=120)
+    response.raise_for_status()
+    with tarfile.open(fileobj=response.raw, mode='r|gz') as tar:
+        for member in tar:
+            name = member.name.split('/', 1)[-1]  # strip the repo-ref prefix
+            if member.isfile() and name in wanted:
+                contents[name] = tar.extractfile(member).read()
+    return [contents[name] for name in names if name in contents]
 
 # Load all CSVs from GitHub
-@st.cache_data(show_spinner=False)
+@st.cache_resource(show_spinner=False)
 def load_all_csvs_from_github():
     try:
-        response = requests.get(GITHUB_API_URL)
-        response.raise_for_status()
-        contents = response.json()
-        csv_files = [f['name'] for f in contents if f['name'].endswith('.csv')]
-
-        data = []
-        for filename in csv_files:
-            raw_url = RAW_BASE_URL + filename
-            file_content = requests.get(raw_url).text
-            df = pd.read_csv(StringIO(file_content))
-            df.columns = df.columns.str.strip()
-            df.rename(columns={
-                'TradDt': 'Date',
-                'ISIN': 'ISIN',
-                'TckrSymb': 'Ticker',
-                'ClsPric': 'Price',
-                'TtlTradgVol': 'Volume'
-            }, inplace=True)
-            df = df[['Date', 'ISIN', 'Ticker', 'Price', 'Volume']]
-            df.dropna(subset=['Date', 'Price', 'Volume'], inplace=True)
-            df['Date'] = pd.to_datetime(df['Date'])
-            data.append(df)
-
-        if not data:
+        shas = list_csv_shas()
+        if not shas:
             raise ValueError("No CSV files loaded.")
-        return pd.concat(data, ignore_index=True)
+
+        cached_shas = {}
+        if SHA_CACHE.exists() and DATA_CACHE.exists():
+            cached_shas = json.loads(SHA_CACHE.read_text())
+        if any(name not in shas for name in cached_shas):
+            # A cached file disappeared upstream; its rows can't be unpicked
+            # from the combined cache, so rebuild from scratch
+            cached_shas = {}
+
+        # Only fetch files whose blob SHA changed since the cache was written
+        changed = [name for name, sha in shas.items() if cached_shas.get(name) != sha]
+        if not changed:
+            return pd.read_parquet(DATA_CACHE, columns=DATA_COLUMNS)
+
+        if cached_shas:
+            # Small delta: fetch just the changed files concurrently
+            file_contents = asyncio.run(_fetch_all([RAW_BASE_URL + name for name in changed]))
+        else:
+            # Full rebuild: grab everything in a single tarball request
+            file_contents = _fetch_tarball_csvs(changed)
+
+        # Collect per-file Arrow tables and concatenate once (zero-copy at
+        # the Arrow level); all row-level postprocessing then runs a single
+        # time over the combined frame instead of once per file
+        tables = [pa_csv.read_csv(BytesIO(file_content),
+                                  convert_options=ARROW_CONVERT_OPTIONS)
+                  for file_content in file_contents]
+        df = pa.concat_tables(tables).to_pandas()
+        df.rename(columns={
+            'TradDt': 'Date',
+            'TckrSymb': 'Ticker',
+            'ClsPric': 'Price',
+            'TtlTradgVol': 'Volume'
+        }, inplace=True)
+        df = df[DATA_COLUMNS]
+        df.dropna(subset=['Date', 'Price', 'Volume'], inplace=True)
+
+        if cached_shas:
+            # Incremental refresh: append the new rows to the cached frame,
+            # letting re-uploaded files overwrite their old rows
+            df = pd.concat([pd.read_parquet(DATA_CACHE, columns=DATA_COLUMNS), df], ignore_index=True)
+            df = df.drop_duplicates(['Date', 'ISIN'], keep='last')
+        df['ISIN'] = df['ISIN'].astype('category')
+        # Ordered categories double as the prebuilt, pre-sorted ticker
+        # universe for the select box
+        df['Ticker'] = df['Ticker'].astype(
+            pd.CategoricalDtype(sorted(df['Ticker'].unique()), ordered=True))
+
+        # One global stable sort; every downstream consumer (alert kernel,
+        # chart slices) relies on ISIN-contiguous, date-ordered rows
+        df = df.sort_values(['ISIN', 'Date'], kind='mergesort').reset_index(drop=True)
+
+        # Guard against non-contiguous blocks sneaking out of concat; the
+        # aggregation scans downstream assume the contiguous fast path
+        for col in ('Price', 'Volume'):
+            values = df[col].to_numpy()
+            if not values.flags.c_contiguous:
+                df[col] = np.ascontiguousarray(values)
+
+        CACHE_DIR.mkdir(exist_ok=True)
+        df.to_parquet(DATA_CACHE, compression='zstd', engine='pyarrow')
+        SHA_CACHE.write_text(json.dumps(shas))
+        return df
 
     except Exception as e:
         st.error(f"❌ Error loading data: {e}")
         return pd.DataFrame()
 
+# Alert analysis, cached on the thresholds and date window. The base
+# frame is a cache_resource singleton, so hash it by identity.
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: id})
+def compute_alerts(base_df, std_k, vol_k, start, end):
+    # Work on a copy: base_df is the shared cache_resource singleton and
+    # must never see the alert columns added below
+    df = base_df[(base_df['Date'] >= pd.to_datetime(start)) & (base_df['Date'] <= pd.to_datetime(end))].copy()
+
+    # One pass over the whole frame (Numba kernel when available,
+    # vectorized groupby otherwise)
+    if HAS_NUMBA:
+        # Rows are already ISIN-contiguous and date-ordered from the loader,
+        # and the date filter preserves that
+        codes, uniques = pd.factorize(df['ISIN'], sort=False)
+        starts = np.searchsorted(codes, np.arange(len(uniques)))
+        ends = np.append(starts[1:], len(codes))
+
+        price_alert = np.zeros(len(df), dtype=np.bool_)
+        volume_spike = np.zeros(len(df), dtype=np.bool_)
+        g_mean = np.empty(len(uniques))
+        g_std = np.empty(len(uniques))
+        g_vmean = np.empty(len(uniques))
+        _alert_kernel(df['Price'].to_numpy(np.float64), df['Volume'].to_numpy(np.float64),
+                      starts, ends, std_k, vol_k,
+                      price_alert, volume_spike, g_mean, g_std, g_vmean)
+
+        df['Price_Alert'] = price_alert
+        df['Volume_Spike'] = volume_spike
+        stats = pd.DataFrame(
+            {('Price', 'mean'): g_mean, ('Price', 'std'): g_std, ('Volume', 'mean'): g_vmean},
+            index=pd.Index(uniques, name='ISIN'),
+        )
+        stats.columns = pd.MultiIndex.from_tuples(stats.columns)
+    else:
+        # Single groupby pass over n, sum(x), sum(x^2): mean/std/volume-mean
+        # fall out of the sums as cheap per-group arithmetic, instead of
+        # three separate reduction passes (sums in float64 to avoid
+        # float32/uint32 overflow)
+        price = df['Price'].to_numpy(np.float64)
+        sums = pd.DataFrame({
+            'ISIN': df['ISIN'],
+            'Price': price,
+            'P2': price * price,
+            'Volume': df['Volume'].to_numpy(np.float64),
+        }).groupby('ISIN', sort=False, observed=True).agg(
+            n=('Price', 'size'), s=('Price', 'sum'), ss=('P2', 'sum'), vs=('Volume', 'sum'))
+
+        mean_price = sums['s'] / sums['n']
+        std_price = np.sqrt((sums['ss'] - sums['s'] ** 2 / sums['n']) / (sums['n'] - 1))
+        mean_vol = sums['vs'] / sums['n']
+
+        # map() over a categorical hands back a categorical; force float
+        # before the arithmetic
+        def broadcast(per_group):
+            return df['ISIN'].map(per_group).astype('float64')
+
+        df['Price_Alert'] = (df['Price'] - broadcast(mean_price)).abs() > std_k * broadcast(std_price)
+        df['Volume_Spike'] = df['Volume'] > vol_k * broadcast(mean_vol)
+
+        # Compact per-ISIN aggregates; bands for the selected stock are derived
+        # from these on demand instead of carrying band columns on every row
+        stats = pd.DataFrame(
+            {('Price', 'mean'): mean_price, ('Price', 'std'): std_price, ('Volume', 'mean'): mean_vol})
+        stats.columns = pd.MultiIndex.from_tuples(stats.columns)
+
+    # The buzzing set is exactly the ISINs present in the price alerts
+    buzzing = pd.unique(df.loc[df['Price_Alert'], 'ISIN'])
+    return df, buzzing, stats
+
+# The ticker universe and ISIN<->Ticker mappings never change within a
+# session; compute them once against the cache_resource singleton
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: id})
+def get_universe(base_df):
+    # Categories are ordered and pre-sorted by the loader: no scan, no sort
+    tickers_sorted = base_df['Ticker'].cat.categories
+    # Series keyed by ISIN: lookups behave like the old dict but are backed
+    # by one ndarray instead of per-key Python hashing, and no intermediate
+    # drop_duplicates frame is allocated
+    isin_map = base_df.groupby('ISIN', sort=False, observed=True)['Ticker'].first()
+    # One ticker per ISIN category code; attaching tickers to alert frames
+    # is then a single array take instead of a dict lookup per row
+    ticker_arr = base_df['ISIN'].cat.categories.map(isin_map).to_numpy()
+    ticker_to_isin = base_df[['Ticker', 'ISIN']].drop_duplicates().set_index('Ticker')['ISIN'].to_dict()
+    return tickers_sorted, isin_map, ticker_arr, ticker_to_isin
+
+# CSV bytes for the download button, cached so reruns with unchanged
+# filters pay nothing; Arrow's writer goes straight to bytes without the
+# str-then-encode round trip of DataFrame.to_csv
+@st.cache_data(show_spinner=False)
+def to_csv_bytes(df):
+    buf = BytesIO()
+    pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), buf)
+    return buf.getvalue()
+
 # Load data
-df = load_all_csvs_from_github()
-if df.empty:
+base_df = load_all_csvs_from_github()
+if base_df.empty:
     st.stop()
 
 # Sidebar settings
@@ -58,60 +298,56 @@ vol_multiplier = st.sidebar.slider("Volume Spike x Avg", 1.0, 10.0, 3.0)
 
 # Date filter
 st.subheader("📆 Date Range Filter")
-min_date, max_date = df['Date'].min(), df['Date'].max()
+min_date, max_date = base_df['Date'].min(), base_df['Date'].max()
 start_date, end_date = st.date_input("Select Date Range", [min_date, max_date])
-df = df[(df['Date'] >= pd.to_datetime(start_date)) & (df['Date'] <= pd.to_datetime(end_date))]
-
-# Analysis
-buzzing = set()
-alerts_price = []
-alerts_volume = []
-analysis_data = {}
-
-for isin, group in df.groupby('ISIN'):
-    group = group.sort_values('Date')
-    mean_price = group['Price'].mean()
-    std_price = group['Price'].std()
-    mean_vol = group['Volume'].mean()
-
-    group['Upper_Band'] = mean_price + std_threshold * std_price
-    group['Lower_Band'] = mean_price - std_threshold * std_price
-    group['Price_Alert'] = (group['Price'] > group['Upper_Band']) | (group['Price'] < group['Lower_Band'])
-    group['Volume_Spike'] = group['Volume'] > vol_multiplier * mean_vol
-
-    if group['Price_Alert'].any():
-        buzzing.add(isin)
-    if group['Price_Alert'].any():
-        alerts_price.append(group[group['Price_Alert']])
-    if group['Volume_Spike'].any():
-        alerts_volume.append(group[group['Volume_Spike']])
-    analysis_data[isin] = group
-
-alerts_price_df = pd.concat(alerts_price) if alerts_price else pd.DataFrame()
-alerts_volume_df = pd.concat(alerts_volume) if alerts_volume else pd.DataFrame()
-isin_map = df[['ISIN', 'Ticker']].drop_duplicates().set_index('ISIN')['Ticker'].to_dict()
-
-# UI: Select stock to visualize
-st.subheader("📊 Stock Chart Viewer")
-tickers_sorted = sorted(df['Ticker'].unique())
-selected_ticker = st.selectbox("Select a Ticker", tickers_sorted)
-selected_isin = df[df['Ticker'] == selected_ticker]['ISIN'].iloc[0]
-selected_df = analysis_data[selected_isin]
-
-# Plot Price with Bands
-st.markdown("### Price and Std Dev Bands")
-fig = go.Figure()
-fig.add_trace(go.Scatter(x=selected_df['Date'], y=selected_df['Price'], mode='lines+markers', name='Price'))
-fig.add_trace(go.Scatter(x=selected_df['Date'], y=selected_df['Upper_Band'], mode='lines', name='Upper Band'))
-fig.add_trace(go.Scatter(x=selected_df['Date'], y=selected_df['Lower_Band'], mode='lines', name='Lower Band'))
-st.plotly_chart(fig, use_container_width=True)
-
-# Volume Histogram
-st.markdown("### Volume Histogram")
-st.plotly_chart(px.histogram(selected_df, x='Date', y='Volume', nbins=30), use_container_width=True)
-
-# Alerts Summary
+
+df, buzzing, stats = compute_alerts(
+    base_df, std_threshold, vol_multiplier, start_date, end_date)
+tickers_sorted, isin_map, ticker_arr, ticker_to_isin = get_universe(base_df)
+
+# UI: Select stock to visualize. The fragment makes ticker changes rerun
+# only this block, not the whole script (and not the alert analysis).
+@st.fragment
+def show_stock(df, tickers_sorted, ticker_to_isin, std_threshold):
+    st.subheader("📊 Stock Chart Viewer")
+    selected_ticker = st.selectbox("Select a Ticker", tickers_sorted)
+    selected_isin = ticker_to_isin[selected_ticker]
+    selected_df = df[df['ISIN'] == selected_isin]  # already date-ordered from the loader's sort
+
+    if selected_df.empty:
+        st.info("No data for this ticker in the selected date range.")
+        return
+
+    # True rolling Bollinger bands for the charted series, computed only
+    # for the selected ticker; the alert scan keeps window-wide stats
+    roll = selected_df['Price'].rolling(window=20, min_periods=5)
+    rolling_mean = roll.mean()
+    rolling_std = roll.std()
+    upper_band = rolling_mean + std_threshold * rolling_std
+    lower_band = rolling_mean - std_threshold * rolling_std
+
+    # Plot Price with Bands
+    st.markdown("### Price and Bollinger Bands (20-day)")
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(x=selected_df['Date'], y=selected_df['Price'], mode='lines', name='Price'))
+    fig.add_trace(go.Scattergl(x=selected_df['Date'], y=upper_band, mode='lines', name='Upper Band', line=dict(dash='dot')))
+    fig.add_trace(go.Scattergl(x=selected_df['Date'], y=lower_band, mode='lines', name='Lower Band', line=dict(dash='dot')))
+    fig.update_layout(uirevision='static')
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Weekly volume, pre-binned server-side so only ~52 bars per year are
+    # serialized to the browser instead of every raw row
+    st.markdown("### Weekly Volume")
+    weekly = selected_df.groupby(pd.Grouper(key='Date', freq='W'))['Volume'].sum().reset_index()
+    st.plotly_chart(px.bar(weekly, x='Date', y='Volume'), use_container_width=True)
+
+show_stock(df, tickers_sorted, ticker_to_isin, std_threshold)
+
+# Alerts Summary: headline counts are cheap boolean sums; the row tables
+# are only materialized inside their expanders
 st.subheader("🚨 Alerts Summary")
+n_price_alerts = int(df['Price_Alert'].sum())
+n_volume_spikes = int(df['Volume_Spike'].sum())
 col1, col2, col3 = st.columns(3)
 
 with col1:
@@ -119,17 +355,19 @@ with col1:
         st.dataframe(pd.DataFrame([{'Ticker': isin_map[i], 'ISIN': i} for i in buzzing]))
 
 with col2:
-    with st.expander(f"⚠️ Price Alerts ({len(alerts_price_df)})"):
-        if not alerts_price_df.empty:
-            alerts_price_df['Ticker'] = alerts_price_df['ISIN'].map(isin_map)
+    with st.expander(f"⚠️ Price Alerts ({n_price_alerts})"):
+        if n_price_alerts:
+            alerts_price_df = df.loc[df['Price_Alert'], ['Date', 'ISIN', 'Price']]
+            alerts_price_df['Ticker'] = ticker_arr[alerts_price_df['ISIN'].cat.codes.to_numpy()]
             st.dataframe(alerts_price_df[['Date', 'Ticker', 'Price']])
 
 with col3:
-    with st.expander(f"📈 Volume Spikes ({len(alerts_volume_df)})"):
-        if not alerts_volume_df.empty:
-            alerts_volume_df['Ticker'] = alerts_volume_df['ISIN'].map(isin_map)
+    with st.expander(f"📈 Volume Spikes ({n_volume_spikes})"):
+        if n_volume_spikes:
+            alerts_volume_df = df.loc[df['Volume_Spike'], ['Date', 'ISIN', 'Volume']]
+            alerts_volume_df['Ticker'] = ticker_arr[alerts_volume_df['ISIN'].cat.codes.to_numpy()]
             st.dataframe(alerts_volume_df[['Date', 'Ticker', 'Volume']])
 
 # Download filtered data
 st.subheader("⬇️ Download Filtered Dataset")
-st.download_button("Download CSV", df.to_csv(index=False).encode(), "filtered_data.csv")
+st.download_button("Download CSV", to_csv_bytes(df), "filtered_data.csv")